@@ -1,8 +1,40 @@
+import gzip
+import hashlib
 import json
 import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+MEMORY_DB = "content_agent_memory.db"
+MEMORY_FILE = "content_agent_memory.json"  # legacy store; imported once, exported on demand
+WORK_LOG_FILE = "content_agent_worklog.jsonl"
+ASSETS_DIR = "assets"  # raw asset payloads, sharded by content-hash prefix
+
+# Entries kept in the active files; older ones are rotated into dated .gz archives
+MEMORY_RETAIN = {
+    "work_log": 5000,
+    "content_library": 1000,
+    "tool_cache": 1024
+}
+
+# Fixed lookups and report rules, built once
+_TOPIC_INDEX = {"post_1": 0, "post_2": 1, "post_3": 2}
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri")
+_SMALL_OUTPUT_TOOLS = ("hashtags",)  # at most 12 fixed tags, so logged as-is without truncate
+_RULE = "-" * 50
+_DRULE = "=" * 50
 
-MEMORY_FILE = "content_agent_memory.json"
+# Append handle for the work log, open for the duration of a run
+work_log_fh = None
 
 agent = {
     "name": "Alpha",
@@ -15,46 +47,379 @@ def now_iso():
     return datetime.now().isoformat(timespec="seconds")
 
 def truncate(text, limit=260):
-    text = str(text)
-    return text if len(text) <= limit else text[:limit] + "...(truncated)"
-
-def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r") as f:
-            memory = json.load(f)
-    else:
-        memory = {}
-
-    memory.setdefault("completed_tasks", [])
-    memory.setdefault("work_log", [])
-    memory.setdefault("content_library", [])  # stores finished assets
-
-    return memory
-
-def save_memory(memory):
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
+    if not isinstance(text, str):
+        text = str(text)
+    return text if len(text) <= limit else f"{text[:limit]}...(truncated)"
+
+def json_dumps(obj, indent=False, sort_keys=False):
+    if orjson:
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option)
+    # Match orjson's compact UTF-8 output so signatures don't depend on the encoder
+    separators = None if indent else (",", ":")
+    return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys,
+                      separators=separators, ensure_ascii=False).encode("utf-8")
+
+def json_loads(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def write_file_atomic(path, data):
+    # One pre-serialized blob, one write call; the rename keeps the old file intact on a crash
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb", buffering=1 << 20) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# --------- Long-term memory (SQLite) ---------
+MEMORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completed (
+    run_key TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    PRIMARY KEY (run_key, task_id)
+);
+CREATE TABLE IF NOT EXISTS content_library (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    goal TEXT,
+    asset_type TEXT,
+    tool TEXT,
+    asset_id TEXT,
+    asset_file TEXT,
+    data BLOB
+);
+CREATE TABLE IF NOT EXISTS tool_cache (
+    sig TEXT PRIMARY KEY,
+    asset_file TEXT NOT NULL,
+    used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tool_cache_used ON tool_cache (used);
+CREATE TABLE IF NOT EXISTS status_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+LIBRARY_COLUMNS = ("timestamp", "goal", "asset_type", "tool", "asset_id", "asset_file", "data")
+
+class Memory:
+    """Long-term agent memory: every change is an indexed write, committed once per run."""
+
+    def __init__(self, path=MEMORY_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 1:
+            # v1 cached full results inline; the cache is disposable, so rebuild it as references
+            self.conn.execute("DROP TABLE IF EXISTS tool_cache")
+        # Every statement is IF NOT EXISTS, so this also adds tables newer than the database
+        self.conn.executescript(MEMORY_SCHEMA)
+        # LRU clock for tool_cache; bumped on every hit or insert
+        self.clock = self.conn.execute("SELECT COALESCE(MAX(used), 0) FROM tool_cache").fetchone()[0]
+        # user_version marks the import as done, so the tracked JSON file is left in place
+        if version == 0:
+            if os.path.exists(MEMORY_FILE):
+                self.import_json(MEMORY_FILE)
+            if not self.status_counts():
+                self.conn.executemany(
+                    "INSERT INTO status_counts (status, count) VALUES (?, ?)",
+                    count_statuses(read_work_log()).items())
+        if version < 2:
+            self.conn.execute("PRAGMA user_version = 2")
+            self.conn.commit()
+        if self.work_log_lines() is None:
+            self.set_work_log_lines(count_lines(WORK_LOG_FILE))
+            self.conn.commit()
+
+    def import_json(self, path):
+        # One-time migration from the single-blob JSON memory file
+        with open(path, "rb") as f:
+            memory = json_loads(f.read())
+
+        # Older memory files kept the work log inline; move it to the JSONL file.
+        # An existing JSONL file means a previous attempt already did, so don't append twice
+        legacy_log = memory.get("work_log")
+        if legacy_log and not os.path.exists(WORK_LOG_FILE):
+            write_file_atomic(WORK_LOG_FILE, b"".join(json_dumps(event) + b"\n" for event in legacy_log))
+
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO completed (run_key, task_id) VALUES (?, ?)",
+            (key.rsplit(":", 1) for key in memory.get("completed_tasks", [])))
+        for asset in memory.get("content_library", []):
+            if "data" in asset:
+                asset = dict(asset, data=json_dumps(asset["data"]))
+            self.add_asset(asset)
+        # tool_cache is not imported: its keys predate canonical_args() and can never hit.
+        # status_counts is rebuilt from the work log, which now holds every legacy event
+
+    def export_json(self, path=MEMORY_FILE):
+        # Writes the legacy single-file layout, for tools that still read it. tool_cache is left
+        # out: it now holds asset references, which older readers would take for inline results
+        library = []
+        for row in self.conn.execute(f"SELECT {', '.join(LIBRARY_COLUMNS)} FROM content_library ORDER BY id"):
+            asset = {k: v for k, v in zip(LIBRARY_COLUMNS, row) if v is not None}
+            if "data" in asset:
+                asset["data"] = json_loads(asset["data"])
+            library.append(asset)
+        memory = {
+            "completed_tasks": [f"{run_key}:{task_id}" for run_key, task_id in
+                                self.conn.execute("SELECT run_key, task_id FROM completed ORDER BY rowid")],
+            "content_library": library,
+            "status_counts": self.status_counts()
+        }
+        write_file_atomic(path, json_dumps(memory, indent=True))
+
+    def is_done(self, run_key, task_id):
+        row = self.conn.execute(
+            "SELECT 1 FROM completed WHERE run_key = ? AND task_id = ?", (run_key, task_id)).fetchone()
+        return row is not None
+
+    def mark_done(self, run_key, task_id):
+        self.conn.execute("INSERT OR IGNORE INTO completed (run_key, task_id) VALUES (?, ?)", (run_key, task_id))
+
+    def all_done(self, run_key, task_ids):
+        placeholders = ", ".join("?" * len(task_ids))
+        row = self.conn.execute(
+            f"SELECT COUNT(*) FROM completed WHERE run_key = ? AND task_id IN ({placeholders})",
+            (run_key, *task_ids)).fetchone()
+        return row[0] == len(set(task_ids))
+
+    def is_cached(self, sig):
+        return self.conn.execute("SELECT 1 FROM tool_cache WHERE sig = ?", (sig,)).fetchone() is not None
+
+    def cache_get(self, sig):
+        # Returns the asset file holding the cached result, or None
+        row = self.conn.execute("SELECT asset_file FROM tool_cache WHERE sig = ?", (sig,)).fetchone()
+        if row is None:
+            return None
+        self.clock += 1
+        self.conn.execute("UPDATE tool_cache SET used = ? WHERE sig = ?", (self.clock, sig))
+        return row[0]
+
+    def cache_put(self, sig, asset_file):
+        self.clock += 1
+        self.conn.execute("INSERT OR REPLACE INTO tool_cache (sig, asset_file, used) VALUES (?, ?, ?)",
+                          (sig, asset_file, self.clock))
+        # Evict the least recently used entries beyond the cap
+        self.conn.execute(
+            "DELETE FROM tool_cache WHERE used <= "
+            "(SELECT used FROM tool_cache ORDER BY used DESC LIMIT 1 OFFSET ?)",
+            (MEMORY_RETAIN["tool_cache"],))
+
+    def add_asset(self, asset):
+        self.conn.execute(
+            f"INSERT INTO content_library ({', '.join(LIBRARY_COLUMNS)}) VALUES ({', '.join('?' * len(LIBRARY_COLUMNS))})",
+            [asset.get(k) for k in LIBRARY_COLUMNS])
+
+    def count_event(self, status):
+        self.conn.execute(
+            "INSERT INTO status_counts (status, count) VALUES (?, 1) "
+            "ON CONFLICT (status) DO UPDATE SET count = count + 1", (status,))
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'work_log_lines'")
+
+    def work_log_lines(self):
+        # Lines in the active work log file, kept here so rotation needn't read it
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'work_log_lines'").fetchone()
+        return None if row is None else row[0]
+
+    def set_work_log_lines(self, n):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('work_log_lines', ?)", (n,))
+
+    def status_counts(self):
+        return dict(self.conn.execute("SELECT status, count FROM status_counts"))
+
+    def rotate_library(self, retain, archive_path):
+        rows = self.conn.execute(
+            f"SELECT id, {', '.join(LIBRARY_COLUMNS)} FROM content_library ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (retain,)).fetchall()
+        if not rows:
+            return
+        rows.reverse()
+        lines = []
+        for row in rows:
+            asset = {k: v for k, v in zip(LIBRARY_COLUMNS, row[1:]) if v is not None}
+            if "data" in asset:
+                asset["data"] = json_loads(asset["data"])
+            lines.append(json_dumps(asset) + b"\n")
+        archive_lines(archive_path, lines)
+        self.conn.execute("DELETE FROM content_library WHERE id <= ?", (rows[-1][0],))
+
+    def save(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def save_asset(result):
+    # Named by the hash of the payload bytes; written atomically, so an existing file is complete
+    ext = "txt" if isinstance(result, str) else "json"
+    data = result.encode("utf-8") if isinstance(result, str) else json_dumps(result, indent=True)
+    digest = content_hash(data)
+    path = os.path.join(ASSETS_DIR, digest[:2], f"{digest}.{ext}")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic(path, data)
+    return path
+
+def load_asset(path):
+    # None means a cache miss: the file is gone, or no longer matches the hash in its name
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if content_hash(data) != asset_id(path):
+        os.remove(path)  # let save_asset write it again
+        return None
+    try:
+        return data.decode("utf-8") if path.endswith(".txt") else json_loads(data)
+    except ValueError:
+        os.remove(path)
+        return None
+
+def asset_id(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def open_work_log():
+    global work_log_fh
+    work_log_fh = open(WORK_LOG_FILE, "ab", buffering=1 << 16)
+
+def close_work_log():
+    global work_log_fh
+    if work_log_fh is None:
+        return
+    work_log_fh.flush()
+    os.fsync(work_log_fh.fileno())
+    work_log_fh.close()
+    work_log_fh = None
+
+@dataclass(slots=True)
+class LogEvent:
+    timestamp: str
+    task: str
+    status: str
+    tool: str = ""
+    output: object = None
+    reason: str | None = None
+    args: bytes | None = None  # canonical JSON from canonical_args()
+
+    @classmethod
+    def from_dict(cls, entry):
+        # For reading the work log back; args stay as logged and aren't needed here
+        return cls(entry.get("timestamp"), entry.get("task"), entry.get("status"),
+                   entry.get("tool", ""), entry.get("output"), entry.get("reason"))
+
+    def to_json(self):
+        fields = {"timestamp": self.timestamp, "task": self.task, "tool": self.tool, "status": self.status}
+        if self.output is not None:
+            fields["output"] = self.output
+        if self.reason is not None:
+            fields["reason"] = self.reason
+        line = json_dumps(fields)
+        if self.args is not None:
+            # Splice in the already-canonical args instead of serializing them again
+            line = line[:-1] + b',"args":' + self.args + b"}"
+        return line
 
 def log_event(memory, event):
-    memory["work_log"].append(event)
-    save_memory(memory)
+    memory.count_event(event.status)
+    # Append-only: one JSON line per event, flushed once per run
+    work_log_fh.write(event.to_json())
+    work_log_fh.write(b"\n")
+
+def read_work_log():
+    if not os.path.exists(WORK_LOG_FILE):
+        return
+    with open(WORK_LOG_FILE, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json_loads(line)
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+def tail_jsonl(path, n, block_size=1 << 16):
+    # Read backwards from EOF in fixed blocks until n complete lines are in hand
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while True:
+            segments = data.split(b"\n")
+            if pos > 0:
+                segments = segments[1:]  # may start mid-line; only complete once the file start is reached
+            lines = [line for line in segments if line.strip()]
+            if pos == 0 or len(lines) >= n:
+                break
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return [json_loads(line) for line in lines[-n:]]
+
+def count_statuses(events):
+    counts = {"completed": 0, "memoized": 0, "clarify": 0, "skipped": 0, "all_skipped": 0}
+    for e in events:
+        status = e.get("status", "other")
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+def archive_lines(path, lines):
+    with gzip.open(path, "ab") as f:
+        f.writelines(lines)
+
+def rotate_memory(memory):
+    stamp = datetime.now().strftime("%Y-%m-%d")
+
+    memory.rotate_library(MEMORY_RETAIN["content_library"], f"content_agent_memory.{stamp}.json.gz")
+
+    # Trim only once the log reaches twice the cap, so most runs skip the rewrite
+    retain = MEMORY_RETAIN["work_log"]
+    if memory.work_log_lines() <= 2 * retain:
+        return
+    with open(WORK_LOG_FILE, "rb") as f:
+        lines = f.readlines()
+    overflow = len(lines) - retain
+    if overflow > 0:
+        archive_lines(f"content_agent_worklog.{stamp}.jsonl.gz", lines[:overflow])
+        write_file_atomic(WORK_LOG_FILE, b"".join(lines[overflow:]))
+    memory.set_work_log_lines(len(lines) - max(overflow, 0))
 
 def print_memory_report(memory, last_n=10):
-    print("\nRUN REPORT")
-    print("=" * 50)
-    total = len(memory["work_log"])
-    completed = sum(1 for e in memory["work_log"] if e.get("status") == "completed")
-    clarify = sum(1 for e in memory["work_log"] if e.get("status") == "clarify")
-    skipped = sum(1 for e in memory["work_log"] if e.get("status") == "skipped")
-
-    print(f"Total log entries: {total}")
-    print(f"Completed: {completed} | Clarify: {clarify} | Skipped: {skipped}")
-    print("\nLast 10 actions:")
-    print("-" * 50)
-
-    for entry in memory["work_log"][-last_n:]:
-        print(f"{entry.get('timestamp')} | {entry.get('status')} | {entry.get('task')} | {entry.get('tool', '')}")
-    print("-" * 50)
+    counts = memory.status_counts()
+    total = sum(counts.values())
+    completed = counts.get("completed", 0)
+    memoized = counts.get("memoized", 0)
+    clarify = counts.get("clarify", 0)
+    skipped = counts.get("skipped", 0)
+    all_skipped = counts.get("all_skipped", 0)
+
+    # Build the whole report, then emit it with a single write
+    lines = ["\nRUN REPORT", _DRULE]
+    lines.append(f"Total log entries: {total}")
+    lines.append(f"Completed: {completed} | Memoized: {memoized} | Clarify: {clarify} | Skipped: {skipped} | All skipped: {all_skipped}")
+    lines.append("\nLast 10 actions:")
+    lines.append(_RULE)
+
+    for entry in map(LogEvent.from_dict, tail_jsonl(WORK_LOG_FILE, last_n)):
+        lines.append(f"{entry.timestamp} | {entry.status} | {entry.task} | {entry.tool}")
+    lines.append(_RULE)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 # --------- Tools (offline) ---------
 def tool_generate_topics(goal, audience, tone):
@@ -79,19 +444,24 @@ def tool_draft_post(topic, audience, tone, cta):
         f"CTA: {cta}\n"
     )
 
-def tool_hashtags(niche):
+@lru_cache(maxsize=256)
+def _hashtags_for(niche):
+    # Pure function of the niche; cached as a tuple so callers can't mutate it
     base = ["#contentstrategy", "#creator", "#marketing", "#smallbusiness", "#consistency"]
-    if "ai" in niche.lower():
+    nl = niche.lower()
+    if "ai" in nl:
         base += ["#ai", "#aiautomation", "#aigent", "#promptengineering", "#futureofwork"]
-    if "real estate" in niche.lower():
+    if "real estate" in nl:
         base += ["#realestate", "#realtor", "#houstonrealestate", "#investing", "#homebuyers"]
-    return base[:12]
+    return tuple(base[:12])
+
+def tool_hashtags(niche):
+    return list(_hashtags_for(niche))
 
 def tool_schedule(topics):
     # 5-post weekly schedule (Mon-Fri)
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri"]
     schedule = []
-    for i, day in enumerate(days):
+    for i, day in enumerate(_WEEKDAYS):
         topic = topics[i] if i < len(topics) else "Bonus: behind the scenes"
         schedule.append({"day": day, "topic": topic})
     return schedule
@@ -120,17 +490,45 @@ workflow = [
 # --------- Decision + guardrails ---------
 def should_skip(task_id, memory, run_key):
     # Prevent repeating the same workflow run
-    completed_key = f"{run_key}:{task_id}"
-    return completed_key in memory["completed_tasks"]
+    return memory.is_done(run_key, task_id)
+
+def canonical_args(args):
+    # Serialized once per step; shared by the cache key and the work log
+    return json_dumps(args, sort_keys=True)
+
+def tool_signature(tool_name, args_bytes):
+    # Same tool + same canonical args -> same result, whichever run asked for it
+    h = hashlib.blake2b(tool_name.encode("utf-8"), digest_size=16)
+    h.update(b"\0")
+    h.update(args_bytes)
+    return h.hexdigest()
 
 def mark_done(task_id, memory, run_key):
-    memory["completed_tasks"].append(f"{run_key}:{task_id}")
-    save_memory(memory)
+    memory.mark_done(run_key, task_id)
 
-def run_system(content_goal, audience, niche, tone, cta):
-    agent["status"] = "working"
-    memory = load_memory()
+def draft_args(task_id, topics, audience, tone, cta):
+    topic_index = _TOPIC_INDEX.get(task_id, 0)
+    return {"topic": topics[topic_index], "audience": audience, "tone": tone, "cta": cta}
 
+def prefetch_drafts(memory, run_key, topics, audience, tone, cta):
+    # Drafts don't depend on each other, so pending ones run concurrently up front;
+    # the main loop still logs and persists them one at a time, in workflow order
+    jobs = {}
+    for step in workflow:
+        task_id = step["id"]
+        if step["tool"] != "draft_post" or should_skip(task_id, memory, run_key):
+            continue
+        args = draft_args(task_id, topics, audience, tone, cta)
+        if not memory.is_cached(tool_signature(step["tool"], canonical_args(args))):
+            jobs[task_id] = args
+
+    if len(jobs) < 2:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {task_id: executor.submit(tools["draft_post"], **args) for task_id, args in jobs.items()}
+    return {task_id: future.result() for task_id, future in futures.items()}
+
+def run_workflow(memory, content_goal, audience, niche, tone, cta):
     # Run key helps you repeat workflows without collisions
     run_key = f"run:{content_goal.lower().strip()}"
 
@@ -140,37 +538,56 @@ def run_system(content_goal, audience, niche, tone, cta):
     print(f"Niche: {niche}")
     print(f"Tone: {tone}")
     print(f"CTA: {cta}\n")
-    print("-" * 50)
+    print(_RULE)
 
     # Guardrail: require a goal
     if not content_goal.strip():
         result = tools["clarify"]("What is the content goal?")
-        log_event(memory, {
-            "timestamp": now_iso(),
-            "task": "clarify_goal",
-            "tool": "clarify",
-            "status": "clarify",
-            "output": truncate(result)
-        })
+        log_event(memory, LogEvent(
+            timestamp=now_iso(),
+            task="clarify_goal",
+            tool="clarify",
+            status="clarify",
+            output=truncate(result)
+        ))
+        memory.save()
+        close_work_log()
         print(result)
         print_memory_report(memory, last_n=10)
         return
 
+    # Guardrail: nothing left to do for this goal, so record one entry instead of a skip per step
+    if memory.all_done(run_key, [step["id"] for step in workflow]):
+        log_event(memory, LogEvent(
+            timestamp=now_iso(),
+            task="workflow",
+            status="all_skipped",
+            reason="Every step already completed for this goal"
+        ))
+        memory.save()
+        close_work_log()
+        print_memory_report(memory, last_n=10)
+        agent["status"] = "complete"
+        print("\nAgent run complete.")
+        return
+
     # Store outputs during the run (short-term memory)
     outputs = {}
+    drafts = {}  # draft_post results computed ahead of their step
 
     for step in workflow:
         task_id = step["id"]
         tool_name = step["tool"]
+        ts = now_iso()  # one timestamp per step, shared by its library and log entries
 
         if should_skip(task_id, memory, run_key):
-            log_event(memory, {
-                "timestamp": now_iso(),
-                "task": task_id,
-                "tool": tool_name,
-                "status": "skipped",
-                "reason": "Already completed for this goal"
-            })
+            log_event(memory, LogEvent(
+                timestamp=ts,
+                task=task_id,
+                tool=tool_name,
+                status="skipped",
+                reason="Already completed for this goal"
+            ))
             continue
 
         # Build arguments based on tool
@@ -181,19 +598,17 @@ def run_system(content_goal, audience, niche, tone, cta):
             # Choose topic from generated topics
             if "topics" not in outputs:
                 result = tools["clarify"]("I need topics first. Run generate_topics.")
-                log_event(memory, {
-                    "timestamp": now_iso(),
-                    "task": task_id,
-                    "tool": "clarify",
-                    "status": "clarify",
-                    "output": truncate(result)
-                })
+                log_event(memory, LogEvent(
+                    timestamp=ts,
+                    task=task_id,
+                    tool="clarify",
+                    status="clarify",
+                    output=truncate(result)
+                ))
                 print(result)
                 continue
 
-            topic_index = {"post_1": 0, "post_2": 1, "post_3": 2}.get(task_id, 0)
-            topic = outputs["topics"][topic_index]
-            args = {"topic": topic, "audience": audience, "tone": tone, "cta": cta}
+            args = draft_args(task_id, outputs["topics"], audience, tone, cta)
 
         elif tool_name == "hashtags":
             args = {"niche": niche}
@@ -201,13 +616,13 @@ def run_system(content_goal, audience, niche, tone, cta):
         elif tool_name == "schedule":
             if "topics" not in outputs:
                 result = tools["clarify"]("I need topics first to build a schedule.")
-                log_event(memory, {
-                    "timestamp": now_iso(),
-                    "task": task_id,
-                    "tool": "clarify",
-                    "status": "clarify",
-                    "output": truncate(result)
-                })
+                log_event(memory, LogEvent(
+                    timestamp=ts,
+                    task=task_id,
+                    tool="clarify",
+                    status="clarify",
+                    output=truncate(result)
+                ))
                 print(result)
                 continue
             args = {"topics": outputs["topics"]}
@@ -215,59 +630,92 @@ def run_system(content_goal, audience, niche, tone, cta):
         else:
             args = {}
 
-        # Execute tool
-        result = tools[tool_name](**args)
+        # Execute tool, reusing a previous result for identical inputs
+        args_bytes = canonical_args(args)
+        sig = tool_signature(tool_name, args_bytes)
+        asset_file = memory.cache_get(sig)
+        result = load_asset(asset_file) if asset_file else None
+        if result is None:
+            status = "completed"
+            if task_id in drafts:
+                result = drafts.pop(task_id)
+            else:
+                result = tools[tool_name](**args)
+            asset_file = save_asset(result)
+            memory.cache_put(sig, asset_file)
+        else:
+            status = "memoized"
 
         # Save output into short-term memory
         outputs[task_id] = result
+        if task_id == "topics":
+            drafts = prefetch_drafts(memory, run_key, result, audience, tone, cta)
 
-        # Persist assets into long-term memory content library
-        memory["content_library"].append({
-            "timestamp": now_iso(),
+        # Persist assets into long-term memory content library (by reference)
+        memory.add_asset({
+            "timestamp": ts,
             "goal": content_goal,
             "asset_type": task_id,
             "tool": tool_name,
-            "data": result
+            "asset_id": asset_id(asset_file),
+            "asset_file": asset_file
         })
 
-        log_event(memory, {
-            "timestamp": now_iso(),
-            "task": task_id,
-            "tool": tool_name,
-            "args": args,
-            "status": "completed",
-            "output": truncate(result)
-        })
+        log_event(memory, LogEvent(
+            timestamp=ts,
+            task=task_id,
+            tool=tool_name,
+            status=status,
+            output=result if tool_name in _SMALL_OUTPUT_TOOLS else truncate(result),
+            args=args_bytes
+        ))
 
         mark_done(task_id, memory, run_key)
 
-    # Final output summary
-    print("\nDELIVERABLES")
-    print("=" * 50)
+    # Commit the whole run as a single transaction
+    close_work_log()
+    rotate_memory(memory)
+    memory.save()
+
+    # Final output summary, emitted with a single write
+    lines = ["\nDELIVERABLES", _DRULE]
 
     topics = outputs.get("topics", [])
     if topics:
-        print("\nTopics:")
+        lines.append("\nTopics:")
         for t in topics:
-            print("-", t)
+            lines.append(f"- {t}")
 
     for pid in ["post_1", "post_2", "post_3"]:
         if pid in outputs:
-            print(f"\n{pid.upper()}:\n{outputs[pid]}")
+            lines.append(f"\n{pid.upper()}:\n{outputs[pid]}")
 
     if "hashtags" in outputs:
-        print("\nHashtags:")
-        print(" ".join(outputs["hashtags"]))
+        lines.append("\nHashtags:")
+        lines.append(" ".join(outputs["hashtags"]))
 
     if "schedule" in outputs:
-        print("\nWeekly Schedule:")
+        lines.append("\nWeekly Schedule:")
         for item in outputs["schedule"]:
-            print(f"{item['day']}: {item['topic']}")
+            lines.append(f"{item['day']}: {item['topic']}")
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
     print_memory_report(memory, last_n=10)
     agent["status"] = "complete"
     print("\nAgent run complete.")
 
+def run_system(content_goal, audience, niche, tone, cta):
+    agent["status"] = "working"
+    memory = Memory()
+    open_work_log()
+    # Even if a step raises, the logged lines and the counts tracking them are persisted together
+    try:
+        run_workflow(memory, content_goal, audience, niche, tone, cta)
+    finally:
+        close_work_log()
+        memory.close()
+
 # --------- Run it ---------
 if __name__ == "__main__":
     # Edit these inputs to match your brand
@@ -0,0 +1,111 @@
+import json
+import sqlite3
+
+import pytest
+
+import content_agent_system as cas
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Every store path is relative, so each test gets its own empty directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write_legacy_json(**memory):
+    with open(cas.MEMORY_FILE, "w") as f:
+        json.dump(memory, f)
+
+
+def test_migrates_json_with_tool_cache():
+    write_legacy_json(
+        completed_tasks=["run:goal:topics"],
+        work_log=[{"timestamp": "2026-01-04T17:17:58", "task": "topics", "status": "completed"}],
+        content_library=[{"timestamp": "2026-01-04T17:17:58", "goal": "goal", "asset_type": "topics",
+                          "tool": "generate_topics", "data": ["a", "b"]}],
+        tool_cache={"0" * 32: ["a", "b"]},
+        status_counts={"completed": 1}
+    )
+
+    memory = cas.Memory()
+    assert memory.is_done("run:goal", "topics")
+    assert memory.status_counts()["completed"] == 1
+    assert memory.conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0] == 0
+    memory.close()
+
+    assert sqlite3.connect(cas.MEMORY_DB).execute("PRAGMA user_version").fetchone()[0] == 2
+    assert cas.count_lines(cas.WORK_LOG_FILE) == 1
+
+
+def test_export_import_round_trip(workdir):
+    memory = cas.Memory()
+    memory.mark_done("run:goal", "topics")
+    memory.cache_put("0" * 32, cas.save_asset("draft"))
+    memory.export_json()
+    memory.close()
+
+    with open(cas.MEMORY_FILE, "rb") as f:
+        assert "tool_cache" not in json.load(f)
+
+    (workdir / cas.MEMORY_DB).unlink()
+    memory = cas.Memory()
+    assert memory.is_done("run:goal", "topics")
+    assert memory.cache_get("0" * 32) is None
+    memory.close()
+
+
+@pytest.mark.parametrize("result", ["Hook: a draft\n", ["#a", "#b"]])
+def test_truncated_asset_is_a_cache_miss(result):
+    path = cas.save_asset(result)
+    assert cas.load_asset(path) == result
+
+    with open(path, "r+b") as f:
+        f.truncate(3)
+    assert cas.load_asset(path) is None
+
+    assert cas.save_asset(result) == path
+    assert cas.load_asset(path) == result
+
+
+@pytest.mark.parametrize("block_size", [1, 6, 7, 1 << 16])
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 10])
+def test_tail_jsonl(n, block_size):
+    with open("log.jsonl", "wb") as f:
+        f.write(b'{"a":1}\n{"a":2}\n\n{"a":3}\n')
+    expected = [{"a": 1}, {"a": 2}, {"a": 3}][-n:] if n else []
+    assert cas.tail_jsonl("log.jsonl", n, block_size) == expected
+
+
+def test_failed_step_keeps_counts_in_step_with_log(monkeypatch):
+    def broken_hashtags(niche):
+        raise RuntimeError("tool failed")
+    monkeypatch.setitem(cas.tools, "hashtags", broken_hashtags)
+
+    with pytest.raises(RuntimeError):
+        cas.run_system("goal", "audience", "AI", "tone", "cta")
+    assert cas.work_log_fh is None
+
+    memory = cas.Memory()
+    assert sum(memory.status_counts().values()) == cas.count_lines(cas.WORK_LOG_FILE) == 4
+    assert memory.work_log_lines() == 4
+    assert memory.is_done("run:goal", "post_3")
+    memory.close()
+
+
+def test_migration_keeps_json_and_never_duplicates_log(workdir):
+    write_legacy_json(
+        completed_tasks=["run:goal:topics"],
+        work_log=[{"timestamp": "2026-01-04T17:17:58", "task": "topics", "status": "completed"}] * 3
+    )
+
+    for _ in range(2):
+        cas.Memory().close()
+        assert (workdir / cas.MEMORY_FILE).exists()
+        assert cas.count_lines(cas.WORK_LOG_FILE) == 3
+        (workdir / cas.MEMORY_DB).unlink()
+
+    memory = cas.Memory()
+    assert memory.status_counts()["completed"] == 3
+    assert memory.is_done("run:goal", "topics")
+    memory.close()